@@ -23,6 +23,14 @@ except ImportError:
     WAVELET_AVAILABLE = False
     print("[!] PyWavelets not available. Install: pip install PyWavelets")
 
+# Payload header: encrypted flag, original size, method id, SHA-256 of the
+# original data, then a length-prefixed filename. Every header byte is 8 LSBs
+# in each embedding frame, so this replaces the JSON header of v1.0 payloads.
+HEADER_FORMAT = '<BIB32sH'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+METHOD_IDS = {'lsb': 0, 'dwt': 1, 'hybrid': 2}
+METHOD_NAMES = {v: k for k, v in METHOD_IDS.items()}
+
 class VideoSteganographyError(Exception):
     """Custom exception for video steganography operations"""
     pass
@@ -40,7 +48,8 @@ class AdvancedVideoSteganography:
         self.password = password
         self.method = method  # 'lsb', 'dwt', 'hybrid'
         self.magic_header = b'ADVVIDEO'
-        self.version = b'v1.0'
+        self.version = b'v2.0'
+        self.legacy_version = b'v1.0'  # JSON header, still extractable
         
         # Embedding parameters
         self.lsb_bits = 1  # Number of LSB bits to use
@@ -112,65 +121,33 @@ class AdvancedVideoSteganography:
     
     def _embed_lsb(self, frame: np.ndarray, data_bits: str, start_pos: int = 0) -> Tuple[np.ndarray, int]:
         """Embed data in frame using LSB technique"""
-        height, width, channels = frame.shape
-        modified_frame = frame.copy()
+        # Embed in all three channels for better capacity: bits fill the frame
+        # channel by channel, row-major within each channel. On a channel-planar
+        # copy that order is one contiguous slice.
+        planar = np.ascontiguousarray(frame.transpose(2, 0, 1))
+        flat = planar.reshape(-1)
         
-        bit_index = 0
-        embedded_bits = 0
+        embedded_bits = min(max(0, len(data_bits) - start_pos), flat.size)
+        if embedded_bits == 0:
+            return frame.copy(), 0
         
-        # Embed in all three channels for better capacity
-        for channel in range(channels):
-            for y in range(height):
-                for x in range(width):
-                    if bit_index + start_pos >= len(data_bits):
-                        return modified_frame, embedded_bits
-                    
-                    # Get the bit to embed
-                    bit = int(data_bits[bit_index + start_pos])
-                    
-                    # Modify LSB of current channel
-                    pixel_value = modified_frame[y, x, channel]
-                    modified_frame[y, x, channel] = (pixel_value & 0xFE) | bit
-                    
-                    bit_index += 1
-                    embedded_bits += 1
-                
-                if bit_index + start_pos >= len(data_bits):
-                    break
-            
-            if bit_index + start_pos >= len(data_bits):
-                break
+        # '0'/'1' characters -> 0/1 values
+        bits = np.frombuffer(data_bits[start_pos:start_pos + embedded_bits].encode('ascii'), dtype=np.uint8) - ord('0')
         
-        return modified_frame, embedded_bits
+        # Modify LSBs in place: clear, then set
+        target = flat[:embedded_bits]
+        target &= 0xFE
+        target |= bits
+        
+        return np.ascontiguousarray(planar.transpose(1, 2, 0)), embedded_bits
     
     def _extract_lsb(self, frame: np.ndarray, bit_count: int) -> str:
         """Extract data from frame using LSB technique"""
-        height, width, channels = frame.shape
-        extracted_bits = []
-        
-        bit_index = 0
-        
         # Extract from all three channels in same order as embedding
-        for channel in range(channels):
-            for y in range(height):
-                for x in range(width):
-                    if bit_index >= bit_count:
-                        break
-                    
-                    # Get LSB of current channel
-                    pixel_value = frame[y, x, channel]
-                    bit = pixel_value & 1
-                    extracted_bits.append(str(bit))
-                    
-                    bit_index += 1
-                
-                if bit_index >= bit_count:
-                    break
-            
-            if bit_index >= bit_count:
-                break
+        flat = np.ascontiguousarray(frame.transpose(2, 0, 1)).reshape(-1)
+        bits = flat[:max(0, bit_count)] & 1
         
-        return ''.join(extracted_bits)
+        return (bits + ord('0')).tobytes().decode('ascii')
     
     def _embed_dwt(self, frame: np.ndarray, data_bits: str, start_pos: int = 0) -> Tuple[np.ndarray, int]:
         """Embed data using DWT coefficients"""
@@ -336,24 +313,22 @@ class AdvancedVideoSteganography:
         else:
             encrypted_data, salt, nonce = data, b'', b''
         
-        # Create header with metadata
-        header_data = {
-            'filename': filename or 'embedded_data.bin',
-            'original_size': len(data),
-            'encrypted': bool(self.password),
-            'method': self.method,
-            'checksum': hashlib.sha256(data).hexdigest()
-        }
-        
-        header_json = json.dumps(header_data).encode()
-        header_size = struct.pack('<I', len(header_json))
+        # Create header with metadata (fixed fields + length-prefixed filename)
+        filename_bytes = (filename or 'embedded_data.bin').encode('utf-8')[:65535]
+        header_bytes = (
+            struct.pack(HEADER_FORMAT, bool(self.password), len(data),
+                        METHOD_IDS.get(self.method, METHOD_IDS['hybrid']),
+                        hashlib.sha256(data).digest(), len(filename_bytes)) +
+            filename_bytes
+        )
+        header_size = struct.pack('<I', len(header_bytes))
         
         # Prepare full payload
         full_payload = (
             self.magic_header + 
             self.version + 
             header_size + 
-            header_json + 
+            header_bytes + 
             salt + 
             nonce + 
             encrypted_data
@@ -524,13 +499,11 @@ class AdvancedVideoSteganography:
                     bits2 = self._extract_dwt(frame, expected_bits//2)
                     extracted_bits = bits1 + bits2
                 
-                # Convert bits to bytes
-                payload_data = bytearray()
-                for i in range(0, len(extracted_bits), 8):
-                    if i + 7 < len(extracted_bits):
-                        byte_bits = extracted_bits[i:i+8]
-                        byte_value = int(byte_bits, 2)
-                        payload_data.append(byte_value)
+                # Convert bits to bytes: the '0'/'1' string maps straight onto a
+                # uint8 array, packed MSB first (whole bytes only)
+                whole_bits = len(extracted_bits) // 8 * 8
+                bit_array = np.frombuffer(extracted_bits[:whole_bits].encode('ascii'), dtype=np.uint8) - ord('0')
+                payload_data = np.packbits(bit_array).tobytes()
                 
                 if len(payload_data) >= payload_size:
                     extracted_payloads.append(bytes(payload_data[:payload_size]))
@@ -556,19 +529,23 @@ class AdvancedVideoSteganography:
         # Find the most common payload (redundancy check)
         best_payload = extracted_payloads[0]  # Start with first
         
+        # Current and v1.0 payloads differ only in how the header is encoded
+        prefixes = (self.magic_header + self.version, self.magic_header + self.legacy_version)
+        
         # Simple validation - use the first payload that has valid magic header
         for i, payload in enumerate(extracted_payloads):
-            if payload.startswith(self.magic_header + self.version):
+            if payload.startswith(prefixes):
                 print(f"[DEBUG] Found valid payload at index {i}")
                 best_payload = payload
                 break
         
         # If no valid header found, try to find it within the payload
-        if not best_payload.startswith(self.magic_header + self.version):
+        if not best_payload.startswith(prefixes):
             print("[DEBUG] No valid magic header found, searching within payloads...")
             for payload in extracted_payloads:
-                magic_pos = payload.find(self.magic_header + self.version)
-                if magic_pos >= 0:
+                positions = [pos for pos in (payload.find(prefix) for prefix in prefixes) if pos >= 0]
+                if positions:
+                    magic_pos = min(positions)
                     print(f"[DEBUG] Found magic header at position {magic_pos}")
                     best_payload = payload[magic_pos:]
                     break
@@ -581,8 +558,9 @@ class AdvancedVideoSteganography:
         # Parse payload
         try:
             # Verify magic header
-            if not full_payload.startswith(self.magic_header + self.version):
+            if not full_payload.startswith(prefixes):
                 raise VideoSteganographyError("Invalid magic header in extracted data")
+            legacy = full_payload.startswith(self.magic_header + self.legacy_version)
             
             offset = len(self.magic_header) + len(self.version)
             
@@ -591,8 +569,7 @@ class AdvancedVideoSteganography:
             offset += 4
             
             # Read header
-            header_json = full_payload[offset:offset+header_size]
-            header_data = json.loads(header_json.decode())
+            header_data = self._parse_header(full_payload[offset:offset+header_size], legacy)
             offset += header_size
             
             # Read salt and nonce (if encrypted)
@@ -630,6 +607,22 @@ class AdvancedVideoSteganography:
         except Exception as e:
             raise VideoSteganographyError(f"Failed to parse extracted payload: {e}")
     
+    def _parse_header(self, header_bytes: bytes, legacy: bool) -> Dict[str, Any]:
+        """Decode the payload header (JSON for v1.0 payloads, packed fields otherwise)"""
+        if legacy:
+            return json.loads(header_bytes.decode())
+        
+        if len(header_bytes) < HEADER_SIZE:
+            raise VideoSteganographyError(f"Header too short: {len(header_bytes)} bytes")
+        encrypted, original_size, method_id, digest, filename_len = struct.unpack_from(HEADER_FORMAT, header_bytes)
+        return {
+            'filename': header_bytes[HEADER_SIZE:HEADER_SIZE + filename_len].decode('utf-8', errors='replace'),
+            'original_size': original_size,
+            'encrypted': bool(encrypted),
+            'method': METHOD_NAMES.get(method_id, 'hybrid'),
+            'checksum': digest.hex()
+        }
+    
     def _reconstruct_payload(self, chunks: List[bytes], expected_size: int) -> bytes:
         """Reconstruct payload from extracted chunks using redundancy"""
         if not chunks:
@@ -732,8 +725,6 @@ def test_video_steganography():
 
 def create_test_video(output_path: str, duration: int = 5):
     """Create a simple test video"""
-    import numpy as np
-    
     width, height = 640, 480
     fps = 30
     total_frames = duration * fps
@@ -741,13 +732,14 @@ def create_test_video(output_path: str, duration: int = 5):
     fourcc = cv2.VideoWriter_fourcc(*'mp4v')
     writer = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
     
+    # The patterns are identical in every frame, so draw them once
+    base_frame = np.zeros((height, width, 3), dtype=np.uint8)
+    cv2.rectangle(base_frame, (50, 50), (width-50, height-50), (100, 150, 200), -1)
+    cv2.circle(base_frame, (width//2, height//2), 50, (255, 100, 100), -1)
+    
+    frame = np.empty_like(base_frame)
     for frame_num in range(total_frames):
-        # Create a colorful frame
-        frame = np.zeros((height, width, 3), dtype=np.uint8)
-        
-        # Add some patterns
-        cv2.rectangle(frame, (50, 50), (width-50, height-50), (100, 150, 200), -1)
-        cv2.circle(frame, (width//2, height//2), 50, (255, 100, 100), -1)
+        np.copyto(frame, base_frame)
         
         # Add frame number
         cv2.putText(frame, f"Frame {frame_num}", (10, 30), 
@@ -24,12 +24,14 @@ from pathlib import Path
 from typing import List, Optional, Dict, Any, Union
 import json
 import shutil
+import asyncio
+import traceback
 from datetime import datetime
 
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Depends
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, BackgroundTasks, Depends, Request, Response
 # from fastapi.staticfiles import StaticFiles  # Not needed in Vercel deployment
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn  # Used for local development server
 import smtplib
@@ -198,6 +200,9 @@ for directory in [UPLOAD_DIR, OUTPUT_DIR, TEMP_DIR]:
 # Global variables for job tracking
 active_jobs: Dict[str, Dict[str, Any]] = {}
 
+# Job statuses after which nothing changes any more (batches can finish with errors)
+TERMINAL_STATUSES = {"completed", "completed_with_errors", "failed"}
+
 # ============================================================================
 # DEPENDENCY INJECTION
 # ============================================================================
@@ -256,17 +261,22 @@ def update_job_status(job_id: str, status: str, progress: int = None,
             "updated_at": datetime.now().isoformat()
         })
 
+# Characters inspected when guessing whether extracted bytes are text
+TEXT_SNIFF_CHARS = 8192
+
 def _is_likely_text_content(data):
     """Check if bytes data is likely UTF-8 text content"""
     if not isinstance(data, bytes) or len(data) == 0:
         return False
     
     try:
-        # Try to decode as UTF-8
+        # Try to decode as UTF-8 (the whole buffer must be valid; this runs in C)
         decoded = data.decode('utf-8')
         
-        # Check if it contains mostly printable characters
-        printable_ratio = sum(1 for c in decoded if c.isprintable() or c.isspace()) / len(decoded)
+        # Check if it contains mostly printable characters. A leading sample is
+        # enough to judge, and keeps the per-character loop bounded on big files.
+        sample = decoded[:TEXT_SNIFF_CHARS]
+        printable_ratio = sum(1 for c in sample if c.isprintable() or c.isspace()) / len(sample)
         
         # If >80% printable characters and no null bytes, likely text
         return printable_ratio > 0.8 and b'\x00' not in data[:min(100, len(data))]
@@ -961,8 +971,7 @@ async def embed_data(
         carrier_path = UPLOAD_DIR / carrier_filename
         
         with open(carrier_path, "wb") as f:
-            content = await carrier_file.read()
-            f.write(content)
+            shutil.copyfileobj(carrier_file.file, f)
         
         # Save content file if provided
         content_file_path = None
@@ -971,8 +980,7 @@ async def embed_data(
             content_file_path = UPLOAD_DIR / content_filename
             
             with open(content_file_path, "wb") as f:
-                content = await content_file.read()
-                f.write(content)
+                shutil.copyfileobj(content_file.file, f)
         
         # Log operation start in database - completely optional, don't let it fail the main operation
         db_operation_id = None
@@ -1223,8 +1231,7 @@ async def embed_data_batch(
                 
                 # Save carrier file
                 with open(carrier_path, "wb") as f:
-                    content = await carrier_file.read()
-                    f.write(content)
+                    shutil.copyfileobj(carrier_file.file, f)
                 
                 # Handle content file for this iteration (need to read it fresh each time)
                 content_file_path = None
@@ -1235,8 +1242,7 @@ async def embed_data_batch(
                     # Read the content file (need to reset the read position)
                     await content_file.seek(0)  # Reset file position
                     with open(content_file_path, "wb") as f:
-                        content = await content_file.read()
-                        f.write(content)
+                        shutil.copyfileobj(content_file.file, f)
                 
                 # Create individual operation ID
                 individual_operation_id = str(uuid.uuid4())
@@ -1353,8 +1359,7 @@ async def extract_data(
         stego_file_path = UPLOAD_DIR / stego_filename
         
         with open(stego_file_path, "wb") as f:
-            content = await stego_file.read()
-            f.write(content)
+            shutil.copyfileobj(stego_file.file, f)
         
         # Log operation start in database - completely optional, don't let it fail the main operation
         db_operation_id = None
@@ -1443,8 +1448,7 @@ async def forensic_extract_data(
         stego_file_path = UPLOAD_DIR / stego_filename
         
         with open(stego_file_path, "wb") as f:
-            content = await stego_file.read()
-            f.write(content)
+            shutil.copyfileobj(stego_file.file, f)
         
         # Log operation start in database
         db_operation_id = None
@@ -1513,8 +1517,7 @@ async def analyze_file(
         temp_file_path = UPLOAD_DIR / temp_filename
         
         with open(temp_file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+            shutil.copyfileobj(file.file, f)
         
         # Get appropriate steganography manager
         manager = get_steganography_manager(carrier_type, password)
@@ -1565,8 +1568,7 @@ async def analyze_file(
         
         finally:
             # Clean up temporary file
-            if temp_file_path.exists():
-                os.remove(temp_file_path)
+            temp_file_path.unlink(missing_ok=True)
         
         return {
             "success": True,
@@ -1575,22 +1577,16 @@ async def analyze_file(
         
     except Exception as e:
         # Clean up on error
-        if 'temp_file_path' in locals() and temp_file_path.exists():
-            os.remove(temp_file_path)
+        if 'temp_file_path' in locals():
+            temp_file_path.unlink(missing_ok=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 # ============================================================================
 # JOB STATUS AND DOWNLOAD ENDPOINTS
 # ============================================================================
 
-@app.get("/api/operations/{operation_id}/status", response_model=StatusResponse)
-async def get_operation_status(operation_id: str):
-    """Get status of a steganography operation (regular or batch)"""
-    if operation_id not in active_jobs:
-        raise HTTPException(status_code=404, detail="Operation not found")
-    
-    job = active_jobs[operation_id]
-    
+def _build_status_response(job: Dict[str, Any]) -> StatusResponse:
+    """Build the StatusResponse for a tracked job (regular or batch)"""
     # Handle batch operations
     if "batch_id" in job:
         total_files = job.get("total_files", 0)
@@ -1639,6 +1635,68 @@ async def get_operation_status(operation_id: str):
             result=job.get("result")
         )
 
+@app.get("/api/operations/status", response_model=Dict[str, StatusResponse])
+async def get_operations_status(ids: str):
+    """Get status of several operations in one round trip (comma-separated ids)"""
+    operation_ids = [op_id.strip() for op_id in ids.split(",") if op_id.strip()]
+    if not operation_ids:
+        raise HTTPException(status_code=400, detail="At least one operation id is required")
+    
+    # Unknown ids are omitted so callers can treat a missing key like a 404
+    return {
+        op_id: _build_status_response(active_jobs[op_id])
+        for op_id in operation_ids
+        if op_id in active_jobs
+    }
+
+@app.get("/api/operations/{operation_id}/status", response_model=StatusResponse)
+async def get_operation_status(operation_id: str, request: Request):
+    """Get status of a steganography operation (regular or batch)"""
+    if operation_id not in active_jobs:
+        raise HTTPException(status_code=404, detail="Operation not found")
+    
+    payload = _build_status_response(active_jobs[operation_id]).model_dump_json()
+    etag = f'"{hashlib.sha1(payload.encode()).hexdigest()}"'
+    
+    # Pollers that send back the last ETag get an empty 304 while nothing changed
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return Response(content=payload, media_type="application/json", headers={"ETag": etag})
+
+@app.get("/api/operations/{operation_id}/events")
+async def stream_operation_status(operation_id: str):
+    """Stream status changes of an operation as server-sent events"""
+    if operation_id not in active_jobs:
+        raise HTTPException(status_code=404, detail="Operation not found")
+    
+    async def event_stream():
+        last_payload = None
+        last_sent = time.monotonic()
+        while operation_id in active_jobs:
+            status = _build_status_response(active_jobs[operation_id])
+            payload = status.model_dump_json()
+            
+            # Only push when something changed; the client never has to poll
+            if payload != last_payload:
+                yield f"data: {payload}\n\n"
+                last_payload = payload
+                last_sent = time.monotonic()
+                if status.status in TERMINAL_STATUSES:
+                    return
+            elif time.monotonic() - last_sent > 15:
+                # Keep-alive comment so proxies don't drop an idle stream
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+            
+            await asyncio.sleep(0.2)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/operations/{operation_id}/download")
 async def download_result(operation_id: str):
     """Download the result file of an operation"""
@@ -1953,7 +2011,6 @@ async def process_embed_operation(
                         except Exception as e:
                             print(f"[EMBED ERROR] Failed to extract existing layers: {e}")
                             print(f"[EMBED ERROR] Exception type: {type(e)}")
-                            import traceback
                             print(f"[EMBED ERROR] Traceback: {traceback.format_exc()}")
                             existing_layers = []
                     else:
@@ -2003,7 +2060,6 @@ async def process_embed_operation(
                         print(f"[EMBED ERROR] Failed to create new layer info: {e}")
                         print(f"[EMBED ERROR] content_file_path: {content_file_path}")
                         print(f"[EMBED ERROR] content_to_hide type: {type(content_to_hide)}")
-                        import traceback
                         print(f"[EMBED ERROR] Traceback: {traceback.format_exc()}")
                         new_layer_info = (content_to_hide, "error_recovery.bin")
                     
@@ -2097,7 +2153,6 @@ async def process_embed_operation(
             except Exception as e:
                 print(f"[DEBUG VIDEO] Exception in video manager: {e}")
                 print(f"[DEBUG VIDEO] Exception type: {type(e)}")
-                import traceback
                 traceback.print_exc()
                 raise
         else:
@@ -2564,7 +2619,6 @@ async def process_forensic_embed_operation(
         
     except Exception as e:
         print(f"[FORENSIC ERROR] Operation {operation_id} failed: {str(e)}")
-        import traceback
         traceback.print_exc()
         
         error_message = translate_error_message(str(e), carrier_type)
@@ -2889,7 +2943,6 @@ This appears to be a standard hidden file without forensic context.
         
     except Exception as e:
         print(f"[FORENSIC EXTRACT ERROR] Operation {operation_id} failed: {str(e)}")
-        import traceback
         traceback.print_exc()
         
         error_message = translate_error_message(str(e), carrier_type)
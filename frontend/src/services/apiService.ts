@@ -180,7 +180,8 @@ class ApiService {
     request: EmbedRequest,
     contentFile?: File,
     userId?: string,
-    onProgress?: (progress: number) => void
+    onProgress?: (progress: number) => void,
+    onError?: (message: string) => void
   ): Promise<OperationResponse> {
     const formData = new FormData();
     formData.append('carrier_file', carrierFile);
@@ -224,7 +225,7 @@ class ApiService {
     
     // Start polling for progress if callback provided
     if (onProgress && result.operation_id) {
-      this.pollOperationStatus(result.operation_id, onProgress);
+      this.pollOperationStatus(result.operation_id, onProgress, onError);
     }
     
     return result;
@@ -234,7 +235,8 @@ class ApiService {
     stegoFile: File,
     request: ExtractRequest,
     userId?: string,
-    onProgress?: (progress: number) => void
+    onProgress?: (progress: number) => void,
+    onError?: (message: string) => void
   ): Promise<OperationResponse> {
     const formData = new FormData();
     formData.append('stego_file', stegoFile);
@@ -261,7 +263,7 @@ class ApiService {
     
     // Start polling for progress if callback provided
     if (onProgress && result.operation_id) {
-      this.pollOperationStatus(result.operation_id, onProgress);
+      this.pollOperationStatus(result.operation_id, onProgress, onError);
     }
     
     return result;
@@ -295,11 +297,25 @@ class ApiService {
   }
 
   // Progress Polling
+  // Starts fast so short jobs report promptly, then backs off exponentially
+  // so long jobs don't hammer the server; gives up after `timeout` ms.
+  // Failures, polling errors and the timeout are reported through `onError`.
   private async pollOperationStatus(
     operationId: string,
     onProgress: (progress: number) => void,
-    interval: number = 1000
+    onError?: (message: string) => void,
+    initialInterval: number = 100,
+    maxInterval: number = 2000,
+    timeout: number = 300000
   ): Promise<void> {
+    const deadline = Date.now() + timeout;
+    let interval = initialInterval;
+
+    const fail = (message: string) => {
+      console.error(message);
+      onError?.(message);
+    };
+
     const poll = async () => {
       try {
         const status = await this.getOperationStatus(operationId);
@@ -308,14 +324,25 @@ class ApiService {
           onProgress(status.progress);
         }
         
-        if (status.status === 'completed' || status.status === 'failed') {
+        if (status.status === 'completed' || status.status === 'completed_with_errors') {
           return; // Stop polling
         }
         
-        // Continue polling
+        if (status.status === 'failed') {
+          fail(status.error || status.message || 'Operation failed');
+          return;
+        }
+        
+        if (Date.now() >= deadline) {
+          fail(`Operation ${operationId} did not finish within ${Math.round(timeout / 1000)} seconds`);
+          return;
+        }
+        
+        // Continue polling with backoff
         setTimeout(poll, interval);
+        interval = Math.min(interval * 1.7, maxInterval);
       } catch (error) {
-        console.error('Error polling operation status:', error);
+        fail(`Error polling operation status: ${error instanceof Error ? error.message : String(error)}`);
       }
     };
     
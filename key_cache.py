@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Shared Password Key Derivation (PBKDF2 / scrypt) with an In-Process Cache
+Used by every module that encrypts payloads with a password
+"""
+
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple, Union
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from cryptography.hazmat.backends import default_backend
+
+# A password given as exactly this many bytes is used directly as the AES-256 key
+RAW_KEY_SIZE = 32
+
+# Key derivation functions, named as payload metadata records them. PBKDF2 is what
+# every payload without a 'kdf' field used; scrypt is memory-hard (16 MiB at n=2^14)
+KDF_PBKDF2 = 'pbkdf2'
+KDF_SCRYPT = 'scrypt'
+SCRYPT_N = 2 ** 14
+
+# Derived AES keys, shared by all instances. Entries are keyed by an HMAC of the
+# password under a per-process random secret (plus the salt), so the cache keys
+# can't be used to test password guesses without the KDF. Each entry expires after
+# _KEY_CACHE_TTL seconds, and its key bytes are zeroed when it is evicted.
+_KEY_CACHE: "OrderedDict[bytes, Tuple[float, bytearray]]" = OrderedDict()
+_KEY_CACHE_SIZE = 32
+_KEY_CACHE_TTL = 60.0
+_KEY_CACHE_SECRET = secrets.token_bytes(32)
+_KEY_CACHE_LOCK = threading.Lock()
+
+
+def is_raw_key(password: Union[str, bytes]) -> bool:
+    """True when the caller supplied a ready-made key rather than a password"""
+    return isinstance(password, bytes) and len(password) == RAW_KEY_SIZE
+
+
+def _evict_key(cache_key: bytes) -> None:
+    """Drop a cache entry and overwrite its key material"""
+    _, key = _KEY_CACHE.pop(cache_key)
+    key[:] = bytes(len(key))
+
+
+def derive_key(password: Union[str, bytes], salt: bytes, kdf: str = KDF_PBKDF2) -> bytes:
+    """AES key for a password, reusing it for repeated (password, salt, kdf) triples.
+    A raw 32-byte key is returned as is; anything else goes through the named KDF."""
+    if is_raw_key(password):
+        return password
+    if kdf not in (KDF_PBKDF2, KDF_SCRYPT):
+        raise ValueError(f"Unsupported key derivation: {kdf}")
+    secret = password.encode() if isinstance(password, str) else password
+    cache_key = hmac.new(_KEY_CACHE_SECRET, kdf.encode() + b'\0' + secret, hashlib.sha256).digest() + salt
+    now = time.monotonic()
+    
+    with _KEY_CACHE_LOCK:
+        # Expired entries go on every lookup, hit or miss
+        for stale in [k for k, (expires, _) in _KEY_CACHE.items() if expires <= now]:
+            _evict_key(stale)
+        entry = _KEY_CACHE.get(cache_key)
+        if entry is not None:
+            _KEY_CACHE.move_to_end(cache_key)
+            # Callers get their own copy; only the cached one is zeroed on eviction
+            return bytes(entry[1])
+    
+    if kdf == KDF_SCRYPT:
+        deriver = Scrypt(
+            salt=salt,
+            length=32,
+            n=SCRYPT_N,
+            r=8,
+            p=1,
+            backend=default_backend()
+        )
+    else:
+        deriver = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=100000,
+            backend=default_backend()
+        )
+    key = deriver.derive(secret)
+    
+    with _KEY_CACHE_LOCK:
+        if cache_key in _KEY_CACHE:
+            _evict_key(cache_key)
+        _KEY_CACHE[cache_key] = (now + _KEY_CACHE_TTL, bytearray(key))
+        while len(_KEY_CACHE) > _KEY_CACHE_SIZE:
+            _evict_key(next(iter(_KEY_CACHE)))
+    return key
@@ -7,6 +7,7 @@ without touching the document structure, content streams, or cross-references.
 """
 
 import os
+import re
 import json
 import struct
 import hashlib
@@ -171,7 +172,6 @@ class SafeDocumentSteganography:
         """Find the next available PDF object number"""
         
         # Simple heuristic: find highest existing object number
-        import re
         pdf_text = pdf_data.decode('latin-1', errors='ignore')
         
         # Find all object definitions
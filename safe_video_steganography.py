@@ -12,9 +12,8 @@ import base64
 import struct
 from typing import Dict, Any, Optional, Union, Tuple
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.backends import default_backend
+from key_cache import derive_key
+
 
 class SafeVideoSteganography:
     """Safe video steganography that never modifies the original video content"""
@@ -24,6 +23,10 @@ class SafeVideoSteganography:
         self.magic_header = b"VEILFORGE_SAFE_VIDEO_V1"
         self.end_marker = b"VEILFORGE_VIDEO_END_V1"
     
+    def set_password(self, password: str):
+        """Switch password without rebuilding the instance"""
+        self.password = password or ""
+    
     def hide_data_in_video(self, video_path: str, secret_data: Union[str, bytes], 
                           output_path: str, is_file: bool = False, 
                           original_filename: str = None) -> Dict[str, Any]:
@@ -180,14 +183,7 @@ class SafeVideoSteganography:
         nonce = os.urandom(12)
         
         # Derive key
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-            backend=default_backend()
-        )
-        key = kdf.derive(self.password.encode())
+        key = derive_key(self.password, salt)
         
         # Encrypt
         aesgcm = AESGCM(key)
@@ -207,14 +203,7 @@ class SafeVideoSteganography:
         ciphertext = encrypted_data[28:]
         
         # Derive key
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-            backend=default_backend()
-        )
-        key = kdf.derive(self.password.encode())
+        key = derive_key(self.password, salt)
         
         # Decrypt
         aesgcm = AESGCM(key)
@@ -227,14 +216,18 @@ class FinalVideoSteganographyManager:
     def __init__(self):
         self.safe_stego = SafeVideoSteganography()
     
+    def set_password(self, password: str):
+        """Set the password on the underlying instance (hide_data/extract_data
+        replace it with their own password argument)"""
+        self.safe_stego.set_password(password)
+    
     def hide_data(self, carrier_file_path: str, content_to_hide: Union[str, bytes], 
                   output_path: str, password: Optional[str] = None, 
                   is_file: bool = False, original_filename: str = None, **kwargs) -> Dict[str, Any]:
         """Hide data in video using safe method"""
         
-        # Set password if provided
-        if password:
-            self.safe_stego.password = password
+        # Every call sets the password, so a call without one never reuses the last caller's
+        self.safe_stego.set_password(password)
         
         return self.safe_stego.hide_data_in_video(
             carrier_file_path, content_to_hide, output_path, 
@@ -245,9 +238,8 @@ class FinalVideoSteganographyManager:
                      output_dir: str = None) -> Optional[Union[Tuple[bytes, str], Dict[str, Any]]]:
         """Extract data from video using safe method"""
         
-        # Set password if provided
-        if password:
-            self.safe_stego.password = password
+        # Every call sets the password, so a call without one never reuses the last caller's
+        self.safe_stego.set_password(password)
         
         result = self.safe_stego.extract_data_from_video(stego_file_path)
         
@@ -98,7 +98,14 @@ def main():
         print("- steganography_operations")
         print("- file_metadata")
         
-        response = input("\nContinue? (y/N): ").strip().lower()
+        if "--yes" in sys.argv[1:]:
+            response = 'y'
+        elif sys.stdin.isatty():
+            response = input("\nContinue? (y/N): ").strip().lower()
+        else:
+            # Never block (or crash on EOF) when run from CI or a pipe
+            print("\nNo interactive terminal; re-run with --yes to confirm.")
+            response = 'n'
         if response != 'y':
             print("Setup cancelled.")
             return
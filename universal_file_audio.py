@@ -7,19 +7,19 @@ Uses optimized multi-band DWT embedding with file type detection
 
 import numpy as np
 import pywt
-import librosa
 import soundfile as sf
 import os
 import json
+import zlib
 import mimetypes
 import struct
+import mmap
+import traceback
 from pathlib import Path
 
 # Cryptography imports for password support
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.backends import default_backend
+from key_cache import derive_key
 import secrets
 
 # Optional dependency for better MIME type detection
@@ -29,15 +29,33 @@ try:
 except ImportError:
     HAS_MAGIC = False
 
+# Optional dependency for decoding formats libsndfile can't read (e.g. older MP3 builds)
+try:
+    import librosa
+    HAS_LIBROSA = True
+except ImportError:
+    HAS_LIBROSA = False
+
+# embed_file package header: magic, version, compression level, codec id,
+# original size, compressed size, CRC32 of the original data. Followed by
+# length-prefixed extension (1 byte), MIME type (1 byte) and filename (2 bytes).
+FILE_HEADER_MAGIC = b'UFA1'
+FILE_HEADER_VERSION = 1
+FILE_HEADER_FORMAT = '<4sBBBIII'
+FILE_HEADER_SIZE = struct.calcsize(FILE_HEADER_FORMAT)
+CODEC_IDS = {'none': 0, 'zlib': 1}
+CODEC_NAMES = {v: k for k, v in CODEC_IDS.items()}
+
 class UniversalFileAudio:
     """Universal file hiding in audio using optimized multi-band embedding"""
     
     def __init__(self, password: str = None):
         self.password = password
         self.redundancy = 2  # Balanced redundancy vs capacity
-        self.wavelet = 'db4'
+        self.wavelet = pywt.Wavelet('db4')  # Built once; pywt accepts the object wherever it takes a name
         self.level = 5
         self.detail_bands = [1, 2, 3, 4]  # Use 4 bands for maximum capacity
+        self.edge_margin = 8  # Coefficients near the band edges don't survive reconstruction
         
     def _get_file_info(self, file_path):
         """Get comprehensive file information"""
@@ -82,19 +100,37 @@ class UniversalFileAudio:
         else:
             return f"{size_bytes/(1024**3):.1f} GB"
     
-    def _get_audio_capacity(self, audio_path):
-        """Calculate total embedding capacity for any file type"""
-        y, sr = librosa.load(audio_path, sr=None)
+    def _load_audio(self, audio_path, mono=True):
+        """Decode audio once, as a (channels, samples) array plus sample rate"""
+        try:
+            y, sr = sf.read(audio_path, dtype='float32', always_2d=True)
+            if mono:
+                # Downmix to mono, matching librosa.load's default
+                y = y.mean(axis=1, dtype=np.float32) if y.shape[1] > 1 else y[:, 0]
+            else:
+                y = np.ascontiguousarray(y.T)
+        except RuntimeError:
+            # libsndfile can't decode this container; fall back to librosa/audioread
+            if not HAS_LIBROSA:
+                raise
+            y, sr = librosa.load(audio_path, sr=None, mono=mono)
+        
         if len(y.shape) == 1:
             y = y.reshape(1, -1)
-        
-        # Use 95% of audio for maximum capacity
-        segment = y[0, :int(y.shape[1] * 0.95)]
-        coeffs = pywt.wavedec(segment, self.wavelet, level=self.level)
-        
+        return y, sr
+    
+    def _embedding_coeffs(self, y):
+        """DWT of the segment embed_file works on (95% of every channel)"""
+        # Use 95% of audio for maximum capacity; all channels in one batched transform
+        segment = y[:, :int(y.shape[1] * 0.95)]
+        coeffs = pywt.wavedec(segment, self.wavelet, level=self.level, axis=-1)
+        return segment, coeffs
+    
+    def _capacity_from_coeffs(self, coeffs):
+        """Calculate total embedding capacity from an already computed DWT"""
         # CRITICAL FIX: Use more realistic capacity calculation
         target_band = 2 if 2 < len(coeffs) else len(coeffs) - 1
-        band_coeffs = len(coeffs[target_band])
+        band_coeffs = coeffs[target_band].shape[-1]  # per channel
         
         # Adaptive capacity: use tighter spacing for small files
         offset = 8  # Skip first few coefficients  
@@ -110,7 +146,46 @@ class UniversalFileAudio:
             max_bits = available_coeffs  # 1:1 coefficient to bit ratio
             max_bytes = max_bits // 8
         
-        return max_bytes, band_coeffs, len(y), sr
+        return max_bytes, band_coeffs
+    
+    def _get_audio_capacity(self, audio_path):
+        """Calculate total embedding capacity for any file type"""
+        y, sr = self._load_audio(audio_path)
+        _, coeffs = self._embedding_coeffs(y)
+        max_bytes, band_coeffs = self._capacity_from_coeffs(coeffs)
+        return max_bytes, band_coeffs, y.shape[1], sr
+    
+    def _package_file(self, file_info, file_data, compression_level):
+        """Compress file data and prepend the header; returns (compressed_data, package)"""
+        # Apply compression if needed
+        compressed_data = file_data
+        codec = 'none'
+        if compression_level > 0:
+            codec = 'zlib'
+            compressed_data = zlib.compress(file_data, level=compression_level)
+            compression_ratio = len(compressed_data) / len(file_data)
+            print(f"🗜️ Compressed: {len(compressed_data)} bytes ({compression_ratio:.1%} of original)")
+        
+        # Compact binary header (fixed fields + length-prefixed strings)
+        extension = file_info['extension'].encode('utf-8')[:255]
+        mime_type = file_info['mime_type'].encode('utf-8')[:255]
+        filename = file_info['filename'].encode('utf-8')[:65535]
+        header = (
+            struct.pack(FILE_HEADER_FORMAT, FILE_HEADER_MAGIC, FILE_HEADER_VERSION,
+                        compression_level, CODEC_IDS[codec], len(file_data),
+                        len(compressed_data), zlib.crc32(file_data)) +
+            struct.pack('<B', len(extension)) + extension +
+            struct.pack('<B', len(mime_type)) + mime_type +
+            struct.pack('<H', len(filename)) + filename
+        )
+        
+        # Package: header + compressed_data
+        total_package = header + compressed_data
+        
+        print(f"📋 Header: {len(header)} bytes")
+        print(f"📦 Total package: {len(total_package)} bytes ({self._format_size(len(total_package))})")
+        
+        return compressed_data, total_package
     
     def embed_file(self, audio_path, file_path, output_path, compression_level=6):
         """
@@ -129,133 +204,91 @@ class UniversalFileAudio:
         print(f"📄 File: {file_info['filename']} ({file_info['readable_size']})")
         print(f"🔍 Type: {file_info['mime_type']} ({file_info['extension']})")
         
-        # Check audio capacity
-        max_bytes, total_coeffs, audio_samples, sr = self._get_audio_capacity(audio_path)
-        print(f"📊 Audio: {audio_samples} samples, {sr} Hz, {audio_samples/sr:.1f}s")
+        # Load audio and transform it once; capacity and embedding share the DWT.
+        # Every channel carries data, so stereo input holds twice as much.
+        y, sr = self._load_audio(audio_path, mono=False)
+        segment, coeffs = self._embedding_coeffs(y)
+        max_bytes, total_coeffs = self._capacity_from_coeffs(coeffs)
+        max_bytes *= y.shape[0]
+        audio_samples = y.shape[1]
+        print(f"📊 Audio: {audio_samples} samples x {y.shape[0]} channel(s), {sr} Hz, {audio_samples/sr:.1f}s")
         print(f"💾 Capacity: {self._format_size(max_bytes)} available")
         
-        # Read file data
+        # Map the file rather than reading it: the compressor and crc32 take the
+        # mapping directly, so the data isn't copied onto the heap first
+        # (empty files can't be mapped)
         with open(file_path, 'rb') as f:
-            file_data = f.read()
-        
-        print(f"📦 Original file: {len(file_data)} bytes")
+            file_data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if file_info['size'] else f.read()
         
-        # Apply compression if needed
-        compressed_data = file_data
-        if compression_level > 0:
-            import zlib
-            compressed_data = zlib.compress(file_data, level=compression_level)
-            compression_ratio = len(compressed_data) / len(file_data)
-            print(f"🗜️ Compressed: {len(compressed_data)} bytes ({compression_ratio:.1%} of original)")
-        
-        # Create comprehensive header
-        header = {
-            'magic': 'UNIVERSAL_FILE_AUDIO',
-            'version': '1.0',
-            'filename': file_info['filename'],
-            'extension': file_info['extension'],
-            'mime_type': file_info['mime_type'],
-            'original_size': len(file_data),
-            'compressed_size': len(compressed_data),
-            'compression_level': compression_level,
-            'checksum': hex(hash(file_data) & 0xFFFFFFFF)  # Simple checksum
-        }
-        
-        header_json = json.dumps(header, separators=(',', ':')).encode('utf-8')
-        
-        # Package: header_length + header + compressed_data
-        total_package = len(header_json).to_bytes(4, 'little') + header_json + compressed_data
-        
-        print(f"📋 Header: {len(header_json)} bytes")
-        print(f"📦 Total package: {len(total_package)} bytes ({self._format_size(len(total_package))})")
-        
-        # Check if it fits
-        if len(total_package) > max_bytes:
-            if compression_level < 9:
-                # Increase compression but ensure it doesn't exceed 9
-                new_compression = min(9, compression_level + 2)
-                if new_compression > compression_level:
-                    print(f"⚠️ File too large, trying higher compression (level {new_compression})...")
-                    return self.embed_file(audio_path, file_path, output_path, new_compression)
-                else:
+        try:
+            original_size = len(file_data)
+            print(f"📦 Original file: {original_size} bytes")
+            
+            # Pick the compression level: start at the requested one and step up
+            # only while the package doesn't fit. The audio and its DWT are reused,
+            # so a retry costs one extra compression pass and nothing else.
+            while True:
+                compressed_data, total_package = self._package_file(file_info, file_data, compression_level)
+                if len(total_package) <= max_bytes:
+                    break
+                # Already-compressed or random data won't shrink at higher levels either
+                incompressible = compression_level > 0 and len(compressed_data) >= 0.95 * original_size
+                if compression_level >= 9 or incompressible:
                     raise ValueError(f"File too large! Need {self._format_size(len(total_package))}, have {self._format_size(max_bytes)}")
-            else:
-                raise ValueError(f"File too large! Need {self._format_size(len(total_package))}, have {self._format_size(max_bytes)}")
+                # Increase compression but ensure it doesn't exceed 9
+                compression_level = min(9, compression_level + 2)
+                print(f"⚠️ File too large, trying higher compression (level {compression_level})...")
+            compressed_size = len(compressed_data)
+        finally:
+            if isinstance(file_data, mmap.mmap):
+                file_data.close()
         
         usage_percent = (len(total_package) / max_bytes) * 100
         print(f"📊 Capacity usage: {usage_percent:.1f}%")
         
-        # Load audio
-        y, sr = librosa.load(audio_path, sr=None)
-        if len(y.shape) == 1:
-            y = y.reshape(1, -1)
-        
-        # Use maximum segment
-        segment = y[0, :int(y.shape[1] * 0.95)]
-        coeffs = pywt.wavedec(segment, self.wavelet, level=self.level)
-        
-        # Convert to bits
-        data_bits = ''.join(format(byte, '08b') for byte in total_package)
+        # Convert to bits (MSB first)
+        data_bits = np.unpackbits(np.frombuffer(total_package, dtype=np.uint8))
         print(f"🔢 Embedding {len(total_package)} bytes ({len(data_bits)} bits)")
         
-        # Distribute across bands with robust embedding
-        bits_per_band = len(data_bits) // len(self.detail_bands)
-        remaining_bits = len(data_bits) % len(self.detail_bands)
-        
+        # Fill the bands in order, channel by channel within each band (every
+        # 4th coefficient); extract_file reads them back in the same order
         bit_index = 0
         
-        for band_idx, band in enumerate(self.detail_bands):
+        for band in self.detail_bands:
             if band >= len(coeffs):
                 continue
-                
-            detail_band = coeffs[band].copy()
             
-            # Calculate bits for this band based on coefficient spacing
-            max_bits_this_band = len(detail_band) // 4  # Every 4th coefficient
-            band_bits = min(bits_per_band, max_bits_this_band)
-            if band_idx < remaining_bits and band_bits < max_bits_this_band:
-                band_bits += 1
-            
-            if bit_index + band_bits > len(data_bits):
-                band_bits = len(data_bits) - bit_index
-            
-            band_data = data_bits[bit_index:bit_index + band_bits]
-            bit_index += band_bits
-            
-            print(f"🔊 Band {band}: {len(detail_band)} coeffs, embedding {len(band_data)} bits")
-            
-            # Embed in this band using robust approach
-            for bit_idx, bit_char in enumerate(band_data):
-                bit_val = int(bit_char)
+            # pywt hands back arrays we own, so write into each channel's row in place
+            for detail_band in coeffs[band]:
+                # Every 4th coefficient, away from the signal boundaries
+                slots = detail_band[self.edge_margin:-self.edge_margin:4]
+                band_data = data_bits[bit_index:bit_index + len(slots)]
+                bit_index += len(band_data)
                 
-                # Use spacing of 4 for robustness
-                coeff_idx = bit_idx * 4
-                if coeff_idx < len(detail_band):
-                    # Use fixed large magnitudes for maximum robustness
-                    if bit_val == 1:
-                        detail_band[coeff_idx] = 1.0   # Strong positive for bit 1
-                    else:
-                        detail_band[coeff_idx] = -1.0  # Strong negative for bit 0
-            
-            # Update coefficients
-            coeffs[band] = detail_band
+                print(f"🔊 Band {band}: {len(detail_band)} coeffs, embedding {len(band_data)} bits")
+                
+                # Embed in this band using robust approach: every 4th coefficient
+                # gets a fixed large magnitude, +1.0 for bit 1 and -1.0 for bit 0
+                slots[:len(band_data)] = band_data * 2.0 - 1.0
+                
+                if bit_index >= len(data_bits):
+                    break
             
             if bit_index >= len(data_bits):
                 break
         
-        # Reconstruct audio
-        y_modified = pywt.waverec(coeffs, self.wavelet)
+        if bit_index < len(data_bits):
+            raise ValueError(f"File too large! Only {bit_index} of {len(data_bits)} bits fit in the detail bands")
         
-        # Ensure same length
-        if len(y_modified) != len(segment):
-            if len(y_modified) > len(segment):
-                y_modified = y_modified[:len(segment)]
-            else:
-                padding = np.zeros(len(segment) - len(y_modified))
-                y_modified = np.concatenate([y_modified, padding])
+        # Reconstruct audio (all channels)
+        y_modified = pywt.waverec(coeffs, self.wavelet, axis=-1)
         
-        # Update audio
-        y[0, :len(y_modified)] = y_modified
+        # Update audio, keeping the segment length: drop any extra samples from
+        # the reconstruction and zero-fill if it came back short
+        segment_length = segment.shape[-1]
+        n = min(y_modified.shape[-1], segment_length)
+        y[:, :n] = y_modified[:, :n]
+        y[:, n:segment_length] = 0
         
         # Save
         audio_out = y[0] if y.shape[0] == 1 else y.T
@@ -264,10 +297,10 @@ class UniversalFileAudio:
         print(f"✅ File embedded successfully in '{output_path}'")
         
         return {
-            'original_file_size': len(file_data),
-            'compressed_size': len(compressed_data),
+            'original_file_size': original_size,
+            'compressed_size': compressed_size,
             'total_package_size': len(total_package),
-            'compression_ratio': f"{len(compressed_data)/len(file_data):.1%}",
+            'compression_ratio': f"{compressed_size/original_size:.1%}",
             'capacity_used': f"{usage_percent:.1f}%",
             'file_type': file_info['mime_type'],
             'bands_used': len([b for b in self.detail_bands if b < len(coeffs)])
@@ -286,14 +319,9 @@ class UniversalFileAudio:
         """
         print(f"🔍 Extracting file from '{audio_path}'")
         
-        # Load audio
-        y, sr = librosa.load(audio_path, sr=None)
-        if len(y.shape) == 1:
-            y = y.reshape(1, -1)
-        
-        # Use same segment
-        segment = y[0, :int(y.shape[1] * 0.95)]
-        coeffs = pywt.wavedec(segment, self.wavelet, level=self.level)
+        # Load audio (all channels) and use same segment
+        y, sr = self._load_audio(audio_path, mono=False)
+        segment, coeffs = self._embedding_coeffs(y)
         
         # Extract bits from all bands in the same order as embedding
         all_bits = []
@@ -302,99 +330,75 @@ class UniversalFileAudio:
             if band >= len(coeffs):
                 continue
                 
-            detail_band = coeffs[band]
-            print(f"🔊 Extracting from band {band}: {len(detail_band)} coefficients")
-            
-            # Extract using robust approach with simple threshold  
-            max_bits_this_band = len(detail_band) // 4  # Match the spacing used in embedding
+            print(f"🔊 Extracting from band {band}: {coeffs[band].shape[-1]} coefficients x {coeffs[band].shape[0]} channel(s)")
             
-            for bit_idx in range(max_bits_this_band):
-                coeff_idx = bit_idx * 4  # Every 4th coefficient to match embedding
-                if coeff_idx < len(detail_band):
-                    coeff = detail_band[coeff_idx]
-                    # Simple positive/negative threshold extraction
-                    bit_value = 1 if coeff > 0 else 0
-                    all_bits.append(str(bit_value))
+            for detail_band in coeffs[band]:
+                # Every 4th coefficient to match embedding: positive = 1, otherwise 0
+                slots = detail_band[self.edge_margin:-self.edge_margin:4]
+                all_bits.append((slots > 0).astype(np.uint8))
         
+        all_bits = np.concatenate(all_bits) if all_bits else np.zeros(0, dtype=np.uint8)
         print(f"📊 Total extracted bits: {len(all_bits)}")
         
         # Debug: Show first few bits
         if len(all_bits) > 64:
-            print(f"[DEBUG] First 64 bits: {''.join(all_bits[:64])}")
+            print(f"[DEBUG] First 64 bits: {''.join(map(str, all_bits[:64]))}")
         
-        # Convert to bytes
-        extracted_bytes = []
-        for i in range(0, len(all_bits), 8):
-            if i + 7 < len(all_bits):
-                byte_bits = ''.join(all_bits[i:i+8])
-                byte_val = int(byte_bits, 2)
-                extracted_bytes.append(byte_val)
+        # Convert to bytes (whole bytes only, MSB first)
+        whole_bits = len(all_bits) - len(all_bits) % 8
+        extracted_bytes = np.packbits(all_bits[:whole_bits]).tobytes()
         
-        print(f"[DEBUG] First 10 extracted bytes: {extracted_bytes[:10]}")
+        print(f"[DEBUG] First 10 extracted bytes: {list(extracted_bytes[:10])}")
         
-        if len(extracted_bytes) < 4:
+        if len(extracted_bytes) < FILE_HEADER_SIZE:
             raise ValueError("Not enough data extracted")
         
-        # Check for magic header first
-        magic_header = b"UNIVERSAL_FILE_AUDIO"
-        magic_found = False
-        start_offset = 0
-        
-        # Look for magic header in first few bytes
-        for offset in range(min(100, len(extracted_bytes) - len(magic_header))):
-            test_magic = bytes(extracted_bytes[offset:offset + len(magic_header)])
-            if test_magic == magic_header:
-                print(f"✅ Magic header found at offset {offset}")
-                start_offset = offset
-                magic_found = True
-                break
+        # Parse the fixed part of the header
+        (magic, version, compression_level, codec_id, original_size,
+         compressed_size, checksum) = struct.unpack_from(FILE_HEADER_FORMAT, extracted_bytes, 0)
         
-        if not magic_found:
+        if magic != FILE_HEADER_MAGIC:
             raise ValueError("Magic header not found")
+        if version != FILE_HEADER_VERSION or codec_id not in CODEC_NAMES:
+            raise ValueError(f"Unsupported header (version {version}, codec {codec_id})")
         
-        # Parse header length from correct position
-        header_length_offset = start_offset + len(magic_header)
-        header_length = int.from_bytes(bytes(extracted_bytes[header_length_offset:header_length_offset+4]), 'little')
-        print(f"📋 Header length: {header_length}")
-        
-        if header_length <= 0 or header_length > 1000:
-            raise ValueError(f"Invalid header length: {header_length}")
-        
-        # Extract header
-        header_start = header_length_offset + 4
-        header_end = header_start + header_length
-        
-        if len(extracted_bytes) < header_end:
-            raise ValueError("Not enough bytes for header")
-        
-        header_bytes = bytes(extracted_bytes[header_start:header_end])
-        
+        # Then the length-prefixed strings
         try:
-            header_str = header_bytes.decode('utf-8')
-            header = json.loads(header_str)
-            print(f"📋 Header parsed successfully")
-        except Exception as e:
-            print(f"[ERROR] Header parsing failed: {e}")
-            raise ValueError(f"Cannot decode header: {e}")
+            offset = FILE_HEADER_SIZE
+            ext_len = extracted_bytes[offset]
+            extension = extracted_bytes[offset + 1:offset + 1 + ext_len].decode('utf-8', errors='replace')
+            offset += 1 + ext_len
+            mime_len = extracted_bytes[offset]
+            mime_type = extracted_bytes[offset + 1:offset + 1 + mime_len].decode('utf-8', errors='replace')
+            offset += 1 + mime_len
+            name_len, = struct.unpack_from('<H', extracted_bytes, offset)
+            filename = extracted_bytes[offset + 2:offset + 2 + name_len].decode('utf-8', errors='replace')
+            offset += 2 + name_len
+        except (IndexError, struct.error):
+            raise ValueError("Not enough bytes for header")
         
+        header = {
+            'filename': filename,
+            'extension': extension,
+            'mime_type': mime_type,
+            'original_size': original_size,
+            'compressed_size': compressed_size,
+            'compression_level': compression_level,
+            'codec': CODEC_NAMES[codec_id],
+            'checksum': checksum
+        }
         print(f"📋 Header: {header}")
         
-        if header.get('magic') != 'UNIVERSAL_FILE_AUDIO':
-            raise ValueError("Not a valid universal file-audio file")
-        
-        # Extract compressed data from corrected position
-        compressed_size = header['compressed_size']
-        data_start = header_end
+        data_start = offset
         data_end = data_start + compressed_size
         
         if len(extracted_bytes) < data_end:
             raise ValueError(f"Not enough bytes for file data: need {data_end}, have {len(extracted_bytes)}")
         
-        compressed_data = bytes(extracted_bytes[data_start:data_end])
+        compressed_data = extracted_bytes[data_start:data_end]
         
         # Decompress if needed
-        if header['compression_level'] > 0:
-            import zlib
+        if header['codec'] == 'zlib':
             file_data = zlib.decompress(compressed_data)
             print(f"🗜️ Decompressed: {len(compressed_data)} → {len(file_data)} bytes")
         else:
@@ -405,9 +409,9 @@ class UniversalFileAudio:
             print(f"⚠️ Size mismatch: expected {header['original_size']}, got {len(file_data)}")
         
         # Verify checksum
-        calculated_checksum = hex(hash(file_data) & 0xFFFFFFFF)
+        calculated_checksum = zlib.crc32(file_data)
         if calculated_checksum != header['checksum']:
-            print(f"⚠️ Checksum mismatch: expected {header['checksum']}, got {calculated_checksum}")
+            print(f"⚠️ Checksum mismatch: expected {header['checksum']:08x}, got {calculated_checksum:08x}")
         
         # Determine output path
         filename = header['filename']
@@ -436,14 +440,7 @@ class UniversalFileAudio:
         nonce = secrets.token_bytes(12)
         
         # Derive key
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-            backend=default_backend()
-        )
-        key = kdf.derive(self.password.encode())
+        key = derive_key(self.password, salt)
         
         # Encrypt
         aesgcm = AESGCM(key)
@@ -461,14 +458,7 @@ class UniversalFileAudio:
         ciphertext = encrypted_data[28:]
         
         # Derive key
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-            backend=default_backend()
-        )
-        key = kdf.derive(self.password.encode())
+        key = derive_key(self.password, salt)
         
         # Decrypt
         aesgcm = AESGCM(key)
@@ -491,8 +481,11 @@ class UniversalFileAudio:
             
             print(f"[SIMPLE AUDIO] Raw data: {len(raw_data)} bytes")
             
+            # Decode the carrier once; it serves the capacity check and the embedding
+            y, sr = self._load_audio(carrier_file_path)
+            
             # Check capacity
-            max_bytes, _, _, _ = self._get_audio_capacity(carrier_file_path)
+            max_bytes, _ = self._capacity_from_coeffs(self._embedding_coeffs(y)[1])
             
             # Create metadata with original filename
             metadata = {
@@ -501,7 +494,6 @@ class UniversalFileAudio:
                 'encrypted': bool(self.password)
             }
             
-            import json
             metadata_json = json.dumps(metadata).encode('utf-8')
             
             # Create header: magic(6) + metadata_length(4) + metadata + data_length(4) + encrypted_data
@@ -530,11 +522,6 @@ class UniversalFileAudio:
                     'error': f'Data too large: need {len(payload)} bytes, have {max_bytes} bytes'
                 }
             
-            # Load and process audio
-            y, sr = librosa.load(carrier_file_path, sr=None)
-            if len(y.shape) == 1:
-                y = y.reshape(1, -1)
-            
             # CRITICAL FIX: Skip the beginning of audio to prevent audible noise
             # Use middle portion of audio for embedding to preserve music quality
             audio_length = y.shape[1]
@@ -550,10 +537,10 @@ class UniversalFileAudio:
             coeffs = pywt.wavedec(segment, self.wavelet, level=self.level)
             
             target_band = 2 if 2 < len(coeffs) else len(coeffs) - 1
-            detail_band = coeffs[target_band].copy()
+            detail_band = coeffs[target_band]  # modified in place
             
-            # Convert payload to bits
-            data_bits = ''.join(format(byte, '08b') for byte in payload)
+            # Convert payload to bits (MSB first)
+            data_bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8))
             print(f"[SIMPLE AUDIO] Embedding {len(data_bits)} bits in band {target_band} (middle segment)")
             
             # CRITICAL FIX: Use adaptive spacing based on available space
@@ -571,41 +558,32 @@ class UniversalFileAudio:
             if required_coeffs > len(detail_band):
                 raise ValueError(f"Insufficient capacity: need {required_coeffs} coefficients, have {len(detail_band)}")
             
-            for bit_idx, bit_char in enumerate(data_bits):
-                bit_val = int(bit_char)
-                coeff_idx = offset + (bit_idx * spacing)
-                
-                if coeff_idx < len(detail_band):
-                    # RELIABLE FIX: Use consistent magnitude-based embedding for reliable extraction
-                    current_coeff = detail_band[coeff_idx]
-                    
-                    # Set a consistent magnitude that's detectable but not too large
-                    base_magnitude = max(0.05, abs(current_coeff) * 0.3)
-                    
-                    # Clear embedding: positive for 1, negative for 0
-                    if bit_val == 1:
-                        detail_band[coeff_idx] = base_magnitude
-                    else:
-                        detail_band[coeff_idx] = -base_magnitude
+            # RELIABLE FIX: Use consistent magnitude-based embedding for reliable extraction.
+            # Work on the strided view of the target coefficients, with a single
+            # scratch buffer for the magnitudes.
+            slab = detail_band[offset:offset + len(data_bits) * spacing:spacing]
             
-            # Update coefficients and reconstruct the segment
-            coeffs[target_band] = detail_band
-            y_modified_segment = pywt.waverec(coeffs, self.wavelet)
+            # Set a consistent magnitude that's detectable but not too large
+            base_magnitude = np.abs(slab)
+            base_magnitude *= 0.3
+            np.maximum(base_magnitude, 0.05, out=base_magnitude)
             
-            # Ensure same length as original segment
-            if len(y_modified_segment) != len(segment):
-                if len(y_modified_segment) > len(segment):
-                    y_modified_segment = y_modified_segment[:len(segment)]
-                else:
-                    padding = np.zeros(len(segment) - len(y_modified_segment))
-                    y_modified_segment = np.concatenate([y_modified_segment, padding])
+            # Clear embedding: positive for 1, negative for 0 (copysign injects the
+            # sign directly instead of blending two full arrays)
+            np.copysign(base_magnitude, data_bits.astype(slab.dtype) * 2 - 1, out=slab)
+            
+            # Reconstruct the segment from the (in-place) modified coefficients
+            y_modified_segment = pywt.waverec(coeffs, self.wavelet)
             
             # CRITICAL: Replace only the middle segment, preserve beginning and end
-            y_out = y.copy()
-            y_out[0, segment_start:segment_start + len(y_modified_segment)] = y_modified_segment
+            # (the decoded carrier isn't needed afterwards, so update it directly).
+            # Keep the segment length: drop extra samples, zero-fill if short.
+            n = min(len(y_modified_segment), len(segment))
+            y[0, segment_start:segment_start + n] = y_modified_segment[:n]
+            y[0, segment_start + n:segment_end] = 0
             
             # Save output
-            audio_out = y_out[0] if y_out.shape[0] == 1 else y_out.T
+            audio_out = y[0] if y.shape[0] == 1 else y.T
             sf.write(output_path, audio_out, sr)
             
             print(f"[SIMPLE AUDIO] Successfully embedded data in {output_path}")
@@ -633,9 +611,7 @@ class UniversalFileAudio:
             print(f"[SIMPLE AUDIO] Extracting from {stego_file_path}")
             
             # Load audio - match embedding segment selection
-            y, sr = librosa.load(stego_file_path, sr=None)
-            if len(y.shape) == 1:
-                y = y.reshape(1, -1)
+            y, sr = self._load_audio(stego_file_path)
             
             # Use same middle segment as embedding
             audio_length = y.shape[1]
@@ -654,53 +630,29 @@ class UniversalFileAudio:
             print(f"[SIMPLE AUDIO] Extracting from band {target_band} (middle segment)")
             
             # Extract bits - match embedding strategy
-            extracted_bits = []
             offset = 8  # Same offset used in embedding
             
-            # Calculate spacing (same as embedding)
-            usable_coeffs = len(detail_band) - 16
-            
             # CRITICAL FIX: Try multiple spacing values to find the right one
             magic_found = False
             
             for spacing in [2, 4, 1]:  # Try different spacing values
-                extracted_bits = []
-                
                 print(f"[SIMPLE AUDIO] Trying spacing {spacing} for extraction")
                 
-                # Extract bits using simple coefficient sign method
+                # Extract bits using simple coefficient sign method: positive = 1, negative = 0
                 max_bits = (len(detail_band) - offset) // spacing
-                for bit_idx in range(max_bits):
-                    coeff_idx = offset + (bit_idx * spacing)
-                    if coeff_idx < len(detail_band):
-                        coeff = detail_band[coeff_idx]
-                        # Simple extraction: positive = 1, negative = 0
-                        bit_value = 1 if coeff > 0 else 0
-                        extracted_bits.append(str(bit_value))
+                extracted_bits = (detail_band[offset::spacing][:max_bits] > 0).astype(np.uint8)
                 
-                # Test if this produces valid magic header
-                if len(extracted_bits) >= 48:  # Need at least 6 bytes for magic
-                    test_bytes = []
-                    for i in range(0, 48, 8):
-                        if i + 7 < len(extracted_bits):
-                            byte_bits = ''.join(extracted_bits[i:i+8])
-                            test_bytes.append(int(byte_bits, 2))
-                    
-                    if len(test_bytes) >= 6 and bytes(test_bytes[:6]) == b'SAUDIO':
-                        print(f"[SIMPLE AUDIO] Found valid magic with spacing {spacing}")
-                        magic_found = True
-                        break
+                # Test if this produces valid magic header (needs at least 6 bytes)
+                if len(extracted_bits) >= 48 and np.packbits(extracted_bits[:48]).tobytes() == b'SAUDIO':
+                    print(f"[SIMPLE AUDIO] Found valid magic with spacing {spacing}")
+                    magic_found = True
+                    break
             
             if not magic_found:
                 print(f"[SIMPLE AUDIO] No valid magic header found with any spacing")
             
-            # Convert to bytes
-            extracted_bytes = []
-            for i in range(0, len(extracted_bits), 8):
-                if i + 7 < len(extracted_bits):
-                    byte_bits = ''.join(extracted_bits[i:i+8])
-                    byte_val = int(byte_bits, 2)
-                    extracted_bytes.append(byte_val)
+            # Convert to bytes (whole bytes only, MSB first)
+            extracted_bytes = np.packbits(extracted_bits[:len(extracted_bits) // 8 * 8]).tobytes()
             
             if len(extracted_bytes) < 10:  # Need at least magic + length
                 print(f"[SIMPLE AUDIO] Not enough data extracted: {len(extracted_bytes)} bytes")
@@ -732,7 +684,6 @@ class UniversalFileAudio:
                     
                 metadata_bytes = bytes(extracted_bytes[metadata_start:metadata_end])
                 
-                import json
                 metadata = json.loads(metadata_bytes.decode('utf-8'))
                 original_filename = metadata.get('filename', 'extracted_data.bin')
                 print(f"[SIMPLE AUDIO] Original filename: {original_filename}")
@@ -849,14 +800,18 @@ def test_universal_file_steganography():
     sr = 44100
     duration = 60
     t = np.linspace(0, duration, sr * duration)
-    # Rich frequency content for better capacity
-    audio = 0.15 * (
-        np.sin(2 * np.pi * 440 * t) +
-        0.8 * np.sin(2 * np.pi * 880 * t) +
-        0.6 * np.sin(2 * np.pi * 1320 * t) +
-        0.4 * np.sin(2 * np.pi * 220 * t) +
-        0.3 * np.random.normal(0, 0.1, len(t))
-    )
+    # Rich frequency content for better capacity; accumulate the tones in
+    # place through one scratch buffer rather than a temporary per term
+    phase = 2 * np.pi * t
+    audio = np.sin(440 * phase)
+    tone = np.empty_like(t)
+    for gain, freq in ((0.8, 880), (0.6, 1320), (0.4, 220)):
+        np.multiply(phase, freq, out=tone)
+        np.sin(tone, out=tone)
+        tone *= gain
+        audio += tone
+    audio += 0.3 * np.random.normal(0, 0.1, len(t))
+    audio *= 0.15
     sf.write('universal_test_audio.wav', audio, sr)
     
     stego = UniversalFileAudio()
@@ -1065,12 +1020,13 @@ if __name__ == "__main__":
             
             # Clean up
             for f in [f'stego_{filename}.wav']:
-                if os.path.exists(f):
+                try:
                     os.remove(f)
+                except FileNotFoundError:
+                    pass
                     
         except Exception as e:
             print(f"❌ Test failed: {e}")
-            import traceback
             traceback.print_exc()
     
     # Summary
@@ -1092,8 +1048,10 @@ if __name__ == "__main__":
     ]
     
     for f in cleanup_files:
-        if os.path.exists(f):
+        try:
             os.remove(f)
+        except FileNotFoundError:
+            pass
 
 if __name__ == "__main__":
     test_universal_file_steganography()
\ No newline at end of file
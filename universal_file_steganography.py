@@ -8,12 +8,38 @@ import os
 import json
 import hashlib
 import base64
+import shutil
 import struct
-from typing import Dict, Any, Optional, Union, Tuple
+from typing import Dict, Any, Optional, Union, Tuple, BinaryIO
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-from cryptography.hazmat.backends import default_backend
+from key_cache import derive_key, is_raw_key, KDF_PBKDF2, KDF_SCRYPT
+
+
+def _file_sha256(path: str) -> str:
+    """SHA-256 hex digest of a file, streamed rather than read into memory"""
+    with open(path, 'rb') as f:
+        if hasattr(hashlib, 'file_digest'):  # Python 3.11+
+            return hashlib.file_digest(f, 'sha256').hexdigest()
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+
+def _part_size(part) -> int:
+    """Length of an in-memory payload or of an open binary file"""
+    if isinstance(part, (bytes, bytearray)):
+        return len(part)
+    return os.fstat(part.fileno()).st_size
+
+
+def _write_part(out, part) -> None:
+    """Write an in-memory payload to out, or stream an open binary file into it"""
+    if isinstance(part, (bytes, bytearray)):
+        out.write(part)
+    else:
+        shutil.copyfileobj(part, out, 1 << 20)
+
 
 class UniversalFileSteganography:
     """Safe universal steganography that never corrupts any file type"""
@@ -23,7 +49,7 @@ class UniversalFileSteganography:
         self.end_marker = b"VEILFORGE_UNIVERSAL_END_V2"
     
     def hide_data(self, carrier_file_path: str, content_to_hide: Union[str, bytes], 
-                  output_path: str, password: Optional[str] = None, 
+                  output_path: str, password: Optional[Union[str, bytes]] = None, 
                   is_file: bool = False, original_filename: str = None, **kwargs) -> Dict[str, Any]:
         """Safe hiding method that preserves ALL file types"""
         
@@ -64,58 +90,84 @@ class UniversalFileSteganography:
     
     def hide_file_in_file(self, container_path: str, secret_file_path: str, 
                          output_path: str) -> Dict[str, Any]:
-        """Safe file-in-file hiding"""
+        """Safe file-in-file hiding, streaming both files instead of loading them"""
         
-        with open(secret_file_path, 'rb') as f:
-            secret_data = f.read()
+        checksum = _file_sha256(secret_file_path)
         filename = os.path.basename(secret_file_path)
-        
-        with open(container_path, 'rb') as f:
-            carrier_data = f.read()
-        
         file_ext = os.path.splitext(container_path)[1].lower()
         
-        return self._safe_embed_universal(carrier_data, secret_data, output_path, None, filename, file_ext)
+        # output_path may be one of the inputs, and opening it for writing would
+        # truncate it before it is read. Stream into a sibling temp file and swap
+        # it in once the inputs are closed.
+        tmp_path = f"{output_path}.{os.urandom(4).hex()}.tmp"
+        try:
+            with open(container_path, 'rb') as carrier_file, open(secret_file_path, 'rb') as secret_file:
+                result = self._safe_embed_universal(carrier_file, secret_file, tmp_path, None, filename, file_ext,
+                                                    checksum=checksum)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return result
     
-    def _safe_embed_universal(self, carrier_data: bytes, secret_data: bytes, 
-                             output_path: str, password: Optional[str], 
-                             filename: str, file_ext: str) -> Dict[str, Any]:
-        """Universal safe embedding for ALL file types"""
+    def _safe_embed_universal(self, carrier_data: Union[bytes, BinaryIO], secret_data: Union[bytes, BinaryIO], 
+                             output_path: str, password: Optional[Union[str, bytes]], 
+                             filename: str, file_ext: str,
+                             checksum: Optional[str] = None) -> Dict[str, Any]:
+        """Universal safe embedding for ALL file types
+        
+        carrier_data and secret_data may be bytes or open binary files; files are
+        streamed into the output. An unencrypted secret_data file needs the
+        precomputed SHA-256 passed as checksum.
+        """
         
-        # Create metadata with original data checksum
+        carrier_size = _part_size(carrier_data)
+        
+        # Create metadata with original data checksum. Encrypted payloads skip it:
+        # the AES-GCM tag already authenticates them.
+        if password:
+            checksum = None
+        elif checksum is None:
+            checksum = hashlib.sha256(secret_data).hexdigest()
         metadata = {
             'filename': filename,
-            'original_size': len(secret_data),
+            'original_size': _part_size(secret_data),
             'encrypted': bool(password),
-            'checksum': hashlib.sha256(secret_data).hexdigest(),
-            'carrier_size': len(carrier_data),
+            'checksum': checksum,
+            'carrier_size': carrier_size,
             'carrier_ext': file_ext
         }
         
         # Encrypt if password provided
         if password:
-            payload_data = self._encrypt_data(secret_data, password)
+            # New payloads use scrypt; extraction follows whatever 'kdf' records
+            metadata['kdf'] = 'none' if is_raw_key(password) else KDF_SCRYPT
+            if not isinstance(secret_data, (bytes, bytearray)):
+                secret_data = secret_data.read()
+            payload_data = self._encrypt_data(secret_data, password, KDF_SCRYPT)
         else:
             payload_data = secret_data
         
         metadata_json = json.dumps(metadata).encode('utf-8')
         
+        payload_size = _part_size(payload_data)
+        
         # Safe format: [ORIGINAL_FILE][MAGIC][META_SIZE][METADATA][DATA_SIZE][DATA][END]
-        safe_file = (
-            carrier_data +  # Original file completely preserved
+        header = (
             self.magic_header +
             len(metadata_json).to_bytes(4, 'little') +
             metadata_json +
-            len(payload_data).to_bytes(4, 'little') +
-            payload_data +
-            self.end_marker
+            payload_size.to_bytes(4, 'little')
         )
         
-        # Write safe file
+        # Write safe file piece by piece rather than concatenating it in memory
         with open(output_path, 'wb') as f:
-            f.write(safe_file)
+            _write_part(f, carrier_data)  # Original file completely preserved
+            f.write(header)
+            _write_part(f, payload_data)
+            f.write(self.end_marker)
         
-        overhead = len(safe_file) - len(carrier_data)
+        overhead = len(header) + payload_size + len(self.end_marker)
         
         print(f"[SAFE UNIVERSAL] ✅ {file_ext.upper()} preserved completely")
         print(f"[SAFE UNIVERSAL] ✅ Added {overhead} bytes safely")
@@ -124,13 +176,13 @@ class UniversalFileSteganography:
         return {
             'success': True,
             'method': 'safe_universal_append',
-            'original_size': len(carrier_data),
-            'final_size': len(safe_file),
+            'original_size': carrier_size,
+            'final_size': carrier_size + overhead,
             'overhead_bytes': overhead,
             'file_type_preserved': True
         }
     
-    def extract_data(self, stego_file_path: str, password: Optional[str] = None, 
+    def extract_data(self, stego_file_path: str, password: Optional[Union[str, bytes]] = None, 
                      output_dir: str = None) -> Optional[Union[Tuple[bytes, str], Dict[str, Any]]]:
         """Safe extraction method"""
         
@@ -157,22 +209,25 @@ class UniversalFileSteganography:
             data_size = int.from_bytes(file_data[data_size_pos:data_size_pos+4], 'little')
             
             payload_pos = data_size_pos + 4
-            payload_data = file_data[payload_pos:payload_pos+data_size]
+            # A view, not a slice: the payload is copied once, by whichever branch below uses it
+            payload_data = memoryview(file_data)[payload_pos:payload_pos+data_size]
             
             # Decrypt if needed
             if metadata['encrypted'] and password:
                 try:
-                    secret_data = self._decrypt_data(payload_data, password)
+                    # Payloads written before the 'kdf' field existed used PBKDF2
+                    secret_data = self._decrypt_data(payload_data, password, metadata.get('kdf', KDF_PBKDF2))
                 except Exception as e:
                     print(f"[SAFE UNIVERSAL] Decryption error: {e}")
                     return None
             else:
-                secret_data = payload_data
+                secret_data = bytes(payload_data)
             
-            # Verify integrity
-            actual_checksum = hashlib.sha256(secret_data).hexdigest()
-            if actual_checksum != metadata['checksum']:
-                print(f"[SAFE UNIVERSAL] ⚠️  Checksum mismatch but continuing")
+            # Verify integrity (a successful decrypt has already checked the GCM tag)
+            if metadata.get('checksum') and not (metadata['encrypted'] and password):
+                actual_checksum = hashlib.sha256(secret_data).hexdigest()
+                if actual_checksum != metadata['checksum']:
+                    print(f"[SAFE UNIVERSAL] ⚠️  Checksum mismatch but continuing")
             
             print(f"[SAFE UNIVERSAL] ✅ Extracted {len(secret_data)} bytes")
             
@@ -209,39 +264,28 @@ class UniversalFileSteganography:
             return result['saved_to']
         return None
     
-    def _encrypt_data(self, data: bytes, password: str) -> bytes:
+    def _encrypt_data(self, data: bytes, password: Union[str, bytes], kdf: str = KDF_PBKDF2) -> bytes:
         """Encrypt data using AES-GCM"""
         salt = os.urandom(16)
         nonce = os.urandom(12)
         
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-            backend=default_backend()
-        )
-        key = kdf.derive(password.encode())
+        key = derive_key(password, salt, kdf)
         
         aesgcm = AESGCM(key)
         ciphertext = aesgcm.encrypt(nonce, data, None)
         
         return salt + nonce + ciphertext
     
-    def _decrypt_data(self, encrypted_data: bytes, password: str) -> bytes:
-        """Decrypt data using AES-GCM"""
-        salt = encrypted_data[:16]
-        nonce = encrypted_data[16:28]
-        ciphertext = encrypted_data[28:]
-        
-        kdf = PBKDF2HMAC(
-            algorithm=hashes.SHA256(),
-            length=32,
-            salt=salt,
-            iterations=100000,
-            backend=default_backend()
-        )
-        key = kdf.derive(password.encode())
+    def _decrypt_data(self, encrypted_data: bytes, password: Union[str, bytes], kdf: str = KDF_PBKDF2) -> bytes:
+        """Decrypt data using AES-GCM (encrypted_data may be a memoryview)"""
+        encrypted_data = memoryview(encrypted_data)
+        salt = bytes(encrypted_data[:16])
+        nonce = bytes(encrypted_data[16:28])
+        # Older cryptography releases only accept bytes here, so this is the
+        # payload's single copy
+        ciphertext = bytes(encrypted_data[28:])
+        
+        key = derive_key(password, salt, kdf)
         
         aesgcm = AESGCM(key)
         return aesgcm.decrypt(nonce, ciphertext, None)
\ No newline at end of file
@@ -12,14 +12,79 @@ import hashlib
 import struct
 from typing import Union, Tuple, Optional, Dict, Any
 import base64
+import functools
 from pathlib import Path
 
+# Payload metadata: data type id, data size, SHA-256 of the data, then a
+# length-prefixed filename. Every metadata byte costs 8 x redundancy channel
+# values, so this replaces the JSON blob that V1 payloads carried.
+METADATA_FORMAT = '<BI32sH'
+METADATA_SIZE = struct.calcsize(METADATA_FORMAT)
+DATA_TYPE_IDS = {'file': 0, 'text': 1, 'binary': 2}
+DATA_TYPE_NAMES = {v: k for k, v in DATA_TYPE_IDS.items()}
+
+
+@functools.lru_cache(maxsize=16)
+def _read_video_properties(video_path: str, mtime: float, size: int) -> Tuple[int, int, int, int]:
+    """Read (fps, width, height, total_frames) once per file version"""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {video_path}")
+    try:
+        return (
+            int(cap.get(cv2.CAP_PROP_FPS)),
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        )
+    finally:
+        cap.release()
+
+
+def get_video_properties(video_path: str) -> Tuple[int, int, int, int]:
+    """Get cached video properties, keyed by path, mtime and size"""
+    stat = os.stat(video_path)
+    return _read_video_properties(video_path, stat.st_mtime, stat.st_size)
+
+
+class _LazyFrames:
+    """Decode frames from a capture only as far as they are iterated, keeping
+    them so later passes can restart from the first frame"""
+    
+    def __init__(self, cap: "cv2.VideoCapture"):
+        self._cap = cap
+        self._frames = []
+    
+    def __iter__(self):
+        index = 0
+        while True:
+            if index == len(self._frames):
+                if self._cap is None:
+                    return
+                ret, frame = self._cap.read()
+                if not ret:
+                    self.release()
+                    return
+                self._frames.append(frame)
+            yield self._frames[index]
+            index += 1
+    
+    def __len__(self) -> int:
+        return len(self._frames)
+    
+    def release(self):
+        if self._cap is not None:
+            self._cap.release()
+            self._cap = None
+
+
 class VideoSteganography:
     """Advanced video steganography using LSB embedding in video frames"""
     
     def __init__(self, password: str = ""):
         self.password = password
-        self.magic_header = b"VEILFORGE_VIDEO_V1"
+        self.magic_header = b"VEILFORGE_VIDEO_V2"
+        self.legacy_magic_header = b"VEILFORGE_VIDEO_V1"  # JSON metadata, still extractable
         self.redundancy = 3  # Triple redundancy for reliability
         
     def _generate_key(self, seed: str) -> int:
@@ -61,22 +126,20 @@ class VideoSteganography:
             filename = filename or 'embedded_data.bin'
             data_type = 'binary'
         
-        # Create metadata
-        metadata = {
-            'filename': filename,
-            'size': len(data_bytes),
-            'type': data_type,
-            'checksum': self._calculate_checksum(data_bytes)
-        }
-        
-        metadata_json = json.dumps(metadata).encode('utf-8')
-        metadata_size = len(metadata_json)
+        # Create metadata (fixed fields + length-prefixed filename)
+        filename_bytes = filename.encode('utf-8')[:65535]
+        metadata_bytes = (
+            struct.pack(METADATA_FORMAT, DATA_TYPE_IDS[data_type], len(data_bytes),
+                        hashlib.sha256(data_bytes).digest(), len(filename_bytes)) +
+            filename_bytes
+        )
+        metadata_size = len(metadata_bytes)
         
         # Pack: magic_header + metadata_size + metadata + data
         payload = (
             self.magic_header +
             struct.pack('<I', metadata_size) +  # 4 bytes for metadata size
-            metadata_json +
+            metadata_bytes +
             data_bytes
         )
         
@@ -88,98 +151,67 @@ class VideoSteganography:
         
         return payload
     
-    def _get_embeddable_pixels(self, frame: np.ndarray) -> int:
-        """Calculate number of pixels available for embedding"""
-        height, width = frame.shape[:2]
-        channels = 3 if len(frame.shape) == 3 else 1
+    def _parse_metadata(self, metadata_bytes: bytes, legacy: bool) -> Dict[str, Any]:
+        """Decode payload metadata (JSON for V1 payloads, packed fields otherwise)"""
+        if legacy:
+            return json.loads(metadata_bytes.decode('utf-8'))
+        
+        if len(metadata_bytes) < METADATA_SIZE:
+            raise ValueError(f"Metadata too short: {len(metadata_bytes)} bytes")
+        type_id, size, digest, filename_len = struct.unpack_from(METADATA_FORMAT, metadata_bytes)
+        filename = metadata_bytes[METADATA_SIZE:METADATA_SIZE + filename_len].decode('utf-8', errors='replace')
+        return {
+            'filename': filename,
+            'size': size,
+            'type': DATA_TYPE_NAMES.get(type_id, 'binary'),
+            'checksum': digest.hex()
+        }
+    
+    def _get_embeddable_pixels(self, height: int, width: int, channels: int = 3) -> int:
+        """Calculate number of pixels available for embedding (one LSB per channel value)"""
         return height * width * channels
     
-    def _embed_payload_in_frame(self, frame: np.ndarray, payload_bits: list, 
+    def _embed_payload_in_frame(self, frame: np.ndarray, payload_bits: np.ndarray, 
                                start_index: int) -> Tuple[np.ndarray, int]:
         """Embed payload bits into a single frame"""
         modified_frame = frame.copy()
-        height, width = frame.shape[:2]
         
-        # Flatten frame for easier access
-        if len(frame.shape) == 3:
-            flat_frame = modified_frame.reshape(-1, 3)
-        else:
-            flat_frame = modified_frame.reshape(-1, 1)
+        # Flatten frame (pixel-major, channel-minor) for easier access
+        flat_frame = modified_frame.reshape(-1)
         
-        channels = flat_frame.shape[1]
-        bits_embedded = 0
-        pixel_count = 0
+        # Each bit occupies `redundancy` consecutive channel values
+        remaining_bits = max(0, len(payload_bits) - start_index)
+        num_values = min(flat_frame.size, remaining_bits * self.redundancy)
+        if num_values == 0:
+            return modified_frame, start_index
         
-        for pixel_idx in range(flat_frame.shape[0]):
-            if start_index + bits_embedded >= len(payload_bits):
-                break
-                
-            for channel in range(channels):
-                if start_index + bits_embedded >= len(payload_bits):
-                    break
-                
-                # Get the bit to embed
-                bit_to_embed = payload_bits[start_index + bits_embedded]
-                
-                # Embed bit using LSB
-                original_value = int(flat_frame[pixel_idx, channel])
-                new_value = (original_value & 0xFE) | bit_to_embed
-                flat_frame[pixel_idx, channel] = new_value
-                
-                pixel_count += 1
-                
-                # Move to next bit after redundancy copies
-                if pixel_count % self.redundancy == 0:
-                    bits_embedded += 1
+        bits_touched = -(-num_values // self.redundancy)
+        bits = payload_bits[start_index:start_index + bits_touched]
+        spread_bits = np.repeat(bits, self.redundancy)[:num_values]
         
-        # Reshape back to original frame shape
-        if len(frame.shape) == 3:
-            modified_frame = flat_frame.reshape(height, width, 3)
-        else:
-            modified_frame = flat_frame.reshape(height, width)
+        # Embed bits using LSB: clear then set, in place on the frame
+        target = flat_frame[:num_values]
+        target &= 0xFE
+        target |= spread_bits
         
-        return modified_frame, start_index + bits_embedded
+        return modified_frame, start_index + num_values // self.redundancy
+    
+    def _vote_bits(self, values: np.ndarray, num_bits: int) -> list:
+        """Majority-vote LSBs over groups of `redundancy` values"""
+        num_bits = max(0, min(num_bits, values.size // self.redundancy))
+        votes = (values[:num_bits * self.redundancy] & 1).reshape(num_bits, self.redundancy)
+        return (votes.sum(axis=1) > self.redundancy // 2).astype(int).tolist()
+    
+    def _bits_to_bytes(self, bits: list, num_bytes: int) -> bytes:
+        """Pack LSB-first bits into at most `num_bytes` whole bytes"""
+        num_bytes = min(num_bytes, len(bits) // 8)
+        return np.packbits(np.asarray(bits[:num_bytes * 8], dtype=np.uint8), bitorder='little').tobytes()
     
     def _extract_payload_from_frame(self, frame: np.ndarray, num_bits: int,
                                   start_index: int) -> Tuple[list, int]:
         """Extract payload bits from a single frame"""
-        height, width = frame.shape[:2]
-        
-        # Flatten frame for easier access
-        if len(frame.shape) == 3:
-            flat_frame = frame.reshape(-1, 3)
-        else:
-            flat_frame = frame.reshape(-1, 1)
-        
-        channels = flat_frame.shape[1]
-        extracted_bits = []
-        bits_extracted = 0
-        pixel_count = 0
-        current_bit_votes = []
-        
-        for pixel_idx in range(flat_frame.shape[0]):
-            if bits_extracted >= num_bits:
-                break
-                
-            for channel in range(channels):
-                if bits_extracted >= num_bits:
-                    break
-                
-                # Extract bit from LSB
-                bit_value = int(flat_frame[pixel_idx, channel]) & 1
-                current_bit_votes.append(bit_value)
-                pixel_count += 1
-                
-                # After redundancy copies, determine the bit value
-                if pixel_count % self.redundancy == 0:
-                    # Majority vote
-                    if len(current_bit_votes) > 0:
-                        final_bit = 1 if sum(current_bit_votes) > len(current_bit_votes) // 2 else 0
-                        extracted_bits.append(final_bit)
-                        bits_extracted += 1
-                        current_bit_votes = []
-        
-        return extracted_bits, start_index + bits_extracted
+        extracted_bits = self._vote_bits(frame.reshape(-1), num_bits)
+        return extracted_bits, start_index + len(extracted_bits)
     
     def embed_data(self, video_path: str, data: Union[str, bytes], 
                    output_path: str, filename: str = None) -> Dict[str, Any]:
@@ -205,20 +237,16 @@ class VideoSteganography:
             # Prepare payload
             payload = self._prepare_payload(data, filename)
             
-            # Convert payload to bits
-            payload_bits = []
-            for byte in payload:
-                for i in range(8):
-                    payload_bits.append((byte >> i) & 1)
-            
-            # Calculate total bits needed with redundancy
-            total_bits_needed = len(payload_bits) * self.redundancy
+            # Calculate total bits needed with redundancy; the capacity check only
+            # needs the payload length, so fail fast before building the bits
+            payload_bit_count = len(payload) * 8
+            total_bits_needed = payload_bit_count * self.redundancy
             
             # Calculate available space
-            pixels_per_frame = self._get_embeddable_pixels(np.zeros((height, width, 3)))
+            pixels_per_frame = self._get_embeddable_pixels(height, width)
             total_available_pixels = pixels_per_frame * total_frames
             
-            print(f"  Bits to embed: {len(payload_bits)}")
+            print(f"  Bits to embed: {payload_bit_count}")
             print(f"  With {self.redundancy}x redundancy: {total_bits_needed}")
             print(f"  Available pixels: {total_available_pixels}")
             print(f"  Capacity check: {'✅ OK' if total_bits_needed <= total_available_pixels else '❌ INSUFFICIENT'}")
@@ -226,6 +254,9 @@ class VideoSteganography:
             if total_bits_needed > total_available_pixels:
                 raise ValueError(f"Video too small: need {total_bits_needed} pixels, have {total_available_pixels}")
             
+            # Convert payload to bits (LSB first within each byte)
+            payload_bits = np.unpackbits(np.frombuffer(payload, dtype=np.uint8), bitorder='little')
+            
             # Setup video writer
             fourcc = cv2.VideoWriter_fourcc(*'mp4v')
             out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
@@ -285,6 +316,7 @@ class VideoSteganography:
     
     def extract_data(self, video_path: str) -> Tuple[Optional[bytes], Optional[str]]:
         """Extract hidden data from video file"""
+        frames = None
         try:
             print(f"[VideoStego] Starting extraction from: {video_path}")
             
@@ -297,16 +329,9 @@ class VideoSteganography:
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
             print(f"[VideoStego] Video has {total_frames} frames")
             
-            # Read all frames first
-            frames = []
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                frames.append(frame)
-            cap.release()
-            
-            print(f"[VideoStego] Loaded {len(frames)} frames for extraction")
+            # Decode frames on demand: extraction stops once the payload length
+            # is known and read, so a small payload only touches the first frames
+            frames = _LazyFrames(cap)
             
             # Extract magic header first
             magic_header_bits_needed = len(self.magic_header) * 8
@@ -325,20 +350,14 @@ class VideoSteganography:
                 extracted_bits.extend(frame_bits)
             
             # Convert bits to bytes for magic header
-            magic_bytes = []
-            for i in range(0, len(self.magic_header) * 8, 8):
-                if i + 8 <= len(extracted_bits):
-                    byte_bits = extracted_bits[i:i+8]
-                    byte_value = sum(bit << j for j, bit in enumerate(byte_bits))
-                    magic_bytes.append(byte_value)
-            
-            extracted_magic = bytes(magic_bytes)
+            extracted_magic = self._bits_to_bytes(extracted_bits, len(self.magic_header))
             print(f"[VideoStego] Extracted magic: {extracted_magic}")
             print(f"[VideoStego] Expected magic: {self.magic_header}")
             
-            if extracted_magic != self.magic_header:
+            if extracted_magic not in (self.magic_header, self.legacy_magic_header):
                 print(f"[VideoStego] ❌ Magic header not found")
                 return None, None
+            legacy = extracted_magic == self.legacy_magic_header
             
             print(f"[VideoStego] ✅ Magic header found!")
             
@@ -357,7 +376,7 @@ class VideoSteganography:
                 
                 # Calculate how many redundant pixels we need to skip
                 pixels_to_skip = current_bit_position // self.redundancy
-                frame_capacity = frame.shape[0] * frame.shape[1] * 3  # height * width * channels
+                frame_capacity = self._get_embeddable_pixels(*frame.shape[:2])
                 
                 if pixels_to_skip >= frame_capacity:
                     # This frame is fully consumed, move to next
@@ -373,17 +392,12 @@ class VideoSteganography:
                 current_bit_position += len(frame_bits) * self.redundancy
             
             # Convert metadata size bits to integer
-            metadata_size_bytes = []
-            for i in range(0, 32, 8):
-                if i + 8 <= len(metadata_size_bits):
-                    byte_bits = metadata_size_bits[i:i+8]
-                    byte_value = sum(bit << j for j, bit in enumerate(byte_bits))
-                    metadata_size_bytes.append(byte_value)
+            metadata_size_bytes = self._bits_to_bytes(metadata_size_bits, 4)
             
             if len(metadata_size_bytes) < 4:
                 raise ValueError("Could not extract metadata size")
             
-            metadata_size = struct.unpack('<I', bytes(metadata_size_bytes))[0]
+            metadata_size = struct.unpack('<I', metadata_size_bytes)[0]
             print(f"[VideoStego] Metadata size: {metadata_size} bytes")
             
             if metadata_size <= 0 or metadata_size > 10000:
@@ -399,7 +413,7 @@ class VideoSteganography:
                     break
                 
                 pixels_to_skip = current_bit_position // self.redundancy
-                frame_capacity = frame.shape[0] * frame.shape[1] * 3
+                frame_capacity = self._get_embeddable_pixels(*frame.shape[:2])
                 
                 if pixels_to_skip >= frame_capacity:
                     current_bit_position -= frame_capacity * self.redundancy
@@ -411,18 +425,12 @@ class VideoSteganography:
                 current_bit_position += len(frame_bits) * self.redundancy
             
             # Convert metadata bits to bytes
-            metadata_bytes = []
-            for i in range(0, metadata_size * 8, 8):
-                if i + 8 <= len(metadata_bits):
-                    byte_bits = metadata_bits[i:i+8]
-                    byte_value = sum(bit << j for j, bit in enumerate(byte_bits))
-                    metadata_bytes.append(byte_value)
+            metadata_bytes = self._bits_to_bytes(metadata_bits, metadata_size)
             
             if len(metadata_bytes) < metadata_size:
                 raise ValueError("Could not extract complete metadata")
             
-            metadata_json = bytes(metadata_bytes).decode('utf-8')
-            metadata = json.loads(metadata_json)
+            metadata = self._parse_metadata(metadata_bytes, legacy)
             
             print(f"[VideoStego] Found metadata: {metadata['filename']}, {metadata['size']} bytes")
             
@@ -437,7 +445,7 @@ class VideoSteganography:
                     break
                 
                 pixels_to_skip = current_bit_position // self.redundancy
-                frame_capacity = frame.shape[0] * frame.shape[1] * 3
+                frame_capacity = self._get_embeddable_pixels(*frame.shape[:2])
                 
                 if pixels_to_skip >= frame_capacity:
                     current_bit_position -= frame_capacity * self.redundancy
@@ -449,17 +457,10 @@ class VideoSteganography:
                 current_bit_position += len(frame_bits) * self.redundancy
             
             # Convert data bits to bytes
-            data_bytes = []
-            for i in range(0, data_size * 8, 8):
-                if i + 8 <= len(data_bits):
-                    byte_bits = data_bits[i:i+8]
-                    byte_value = sum(bit << j for j, bit in enumerate(byte_bits))
-                    data_bytes.append(byte_value)
-            
-            if len(data_bytes) < data_size:
-                raise ValueError("Could not extract complete data")
+            extracted_data = self._bits_to_bytes(data_bits, data_size)
             
-            extracted_data = bytes(data_bytes)
+            if len(extracted_data) < data_size:
+                raise ValueError("Could not extract complete data")
             
             # Verify checksum
             expected_checksum = metadata['checksum']
@@ -473,54 +474,24 @@ class VideoSteganography:
             if expected_checksum != actual_checksum:
                 print(f"[VideoStego] ⚠️ Checksum mismatch - data may be corrupted")
             
-            print(f"[VideoStego] ✅ Successfully extracted {len(extracted_data)} bytes")
+            print(f"[VideoStego] ✅ Successfully extracted {len(extracted_data)} bytes (decoded {len(frames)} frames)")
             
             return extracted_data, metadata['filename']
             
         except Exception as e:
             print(f"[VideoStego] ❌ Extraction failed: {e}")
             return None, None
+        finally:
+            if frames is not None:
+                frames.release()
     
     def _extract_bits_from_position(self, frame: np.ndarray, num_bits: int, skip_pixels: int) -> list:
         """Extract bits from frame starting at a specific pixel position"""
-        height, width = frame.shape[:2]
-        
-        if len(frame.shape) == 3:
-            flat_frame = frame.reshape(-1, 3)
-        else:
-            flat_frame = frame.reshape(-1, 1)
-        
-        channels = flat_frame.shape[1]
-        extracted_bits = []
-        pixel_count = 0
-        current_bit_votes = []
-        bits_extracted = 0
+        channels = frame.shape[2] if len(frame.shape) == 3 else 1
         
         # Skip the specified number of pixels
-        start_pixel = skip_pixels
-        
-        for pixel_idx in range(start_pixel, flat_frame.shape[0]):
-            if bits_extracted >= num_bits:
-                break
-                
-            for channel in range(channels):
-                if bits_extracted >= num_bits:
-                    break
-                
-                # Extract bit from LSB
-                bit_value = int(flat_frame[pixel_idx, channel]) & 1
-                current_bit_votes.append(bit_value)
-                pixel_count += 1
-                
-                # After redundancy copies, determine the bit value
-                if pixel_count % self.redundancy == 0:
-                    if len(current_bit_votes) > 0:
-                        final_bit = 1 if sum(current_bit_votes) > len(current_bit_votes) // 2 else 0
-                        extracted_bits.append(final_bit)
-                        bits_extracted += 1
-                        current_bit_votes = []
-        
-        return extracted_bits
+        values = frame.reshape(-1)[skip_pixels * channels:]
+        return self._vote_bits(values, num_bits)
 
 
 class VideoSteganographyManager:
@@ -560,22 +531,13 @@ class VideoSteganographyManager:
     def get_video_info(self, video_path: str) -> Dict[str, Any]:
         """Get video file information and capacity"""
         try:
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                return {'error': f'Cannot open video: {video_path}'}
-            
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            fps, width, height, total_frames = get_video_properties(video_path)
             
             # Calculate capacity
-            pixels_per_frame = width * height * 3  # RGB channels
+            pixels_per_frame = self.video_stego._get_embeddable_pixels(height, width)
             total_pixels = pixels_per_frame * total_frames
             max_bytes = total_pixels // (8 * 3)  # 3x redundancy, 8 bits per byte
             
-            cap.release()
-            
             return {
                 'width': width,
                 'height': height,
@@ -604,14 +566,19 @@ def create_test_video(output_path: str = "test_video.mp4", duration: int = 5) ->
         
         print(f"Creating test video: {output_path} ({duration}s, {total_frames} frames)")
         
+        # Per-frame background colours for the whole clip, computed in one pass
+        frame_nums = np.arange(total_frames)
+        colours = np.empty((total_frames, 3), dtype=np.uint8)
+        colours[:, 0] = (frame_nums * 2) % 256  # Red channel changes over time
+        colours[:, 1] = 128 + 64 * np.sin(frame_nums * 0.1)  # Green oscillates
+        colours[:, 2] = 255 - (frame_nums * 2) % 256  # Blue decreases
+        
+        # Reuse a single frame buffer instead of allocating one per frame
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        
         for frame_num in range(total_frames):
             # Create a colorful test pattern
-            frame = np.zeros((height, width, 3), dtype=np.uint8)
-            
-            # Add some patterns
-            frame[:, :, 0] = (frame_num * 2) % 256  # Red channel changes over time
-            frame[:, :, 1] = 128 + 64 * np.sin(frame_num * 0.1)  # Green oscillates
-            frame[:, :, 2] = 255 - (frame_num * 2) % 256  # Blue decreases
+            frame[:] = colours[frame_num]
             
             # Add some geometric shapes
             cv2.rectangle(frame, (50, 50), (150, 150), (255, 255, 255), 2)
@@ -674,8 +641,9 @@ def demo_video_steganography():
     print(f"\n🖼️ TEST 2: Image File")
     
     # Create a small test image
-    test_image = np.random.randint(0, 256, (100, 100, 3), dtype=np.uint8)
-    cv2.imwrite("test_image.png", test_image)
+    test_image = np.random.default_rng().integers(0, 256, (100, 100, 3), dtype=np.uint8)
+    # Random pixels do not compress, so skip the expensive zlib levels
+    cv2.imwrite("test_image.png", test_image, [cv2.IMWRITE_PNG_COMPRESSION, 1])
     
     result2 = manager.hide_data(test_video, "test_image.png", "stego_image_video.mp4", is_file=True)
     